@@ -1,10 +1,10 @@
 from sqlalchemy import (
     create_engine, Column, Integer, String, Table, MetaData
 )
-from sqlalchemy.orm import declarative_base, Session
+from sqlalchemy.orm import declarative_base, Session, aliased
 from sqlalchemy.ext.declarative import declared_attr
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import cast, func, inspect
+from sqlalchemy import cast, func, inspect, text, exists, or_, and_
 import numpy as np
 import os
 
@@ -51,6 +51,7 @@ def fetch_embedding_table(model_type, model_dim):
             Column("vector", Vector(dim=model_dim), nullable=False),
             Column("model_id", String, nullable=False),
             Column("image_uri", String, nullable=False), 
+            Column("thumbnail_key", String, nullable=True),
             extend_existing=True,  # Allow redefining options if it already exists
         )
         metadata.create_all(bind=engine)
@@ -71,29 +72,40 @@ def fetch_embedding_table(model_type, model_dim):
                 "vector": Column(Vector(dim=model_dim), nullable=False),
                 "model_id": Column(String, nullable=False),
                 "image_uri": Column(String, nullable=False),  
+                "thumbnail_key": Column(String, nullable=True),
             },
         )
+
+        with engine.begin() as conn:
+            # Tables created before thumbnails were added lack the column
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS thumbnail_key VARCHAR"))
+            # Lets the cascade rerank and its EXISTS filter look up rows by image_uri
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_model_id_image_uri_idx "
+                f"ON {table_name} (model_id, image_uri)"
+            ))
         _emb_table_classes[table_name] = table_class
 
     return _emb_table_classes[table_name]
 
 
-def save_vector(vector, model_id, model_type, model_dim, image_uri=None):
+def save_vector(vector, model_id, model_type, model_dim, image_uri=None, thumbnail_key=None):
     table_class = fetch_embedding_table(model_type, model_dim)  # Already returns a class
 
     with Session(engine) as session:
-        vector_dict = {"vector": vector.tolist(), "model_id": model_id, "image_uri": image_uri}
+        vector_dict = {"vector": vector.tolist(), "model_id": model_id, "image_uri": image_uri,
+                       "thumbnail_key": thumbnail_key}
         session.add(table_class(**vector_dict))
         session.commit()
 
 
-def save_vectors_bulk(vectors, model_id, model_type, model_dim, image_uris=None):
+def save_vectors_bulk(vectors, model_id, model_type, model_dim, image_uris=None, thumbnail_keys=None):
     table_class = fetch_embedding_table(model_type, model_dim)  # Already returns a class
 
     with Session(engine) as session:
         vector_dicts = [
-            {"vector": v.tolist(), "model_id": model_id, "image_uri": uri}
-            for v, uri in zip(vectors, image_uris or [])
+            {"vector": v.tolist(), "model_id": model_id, "image_uri": uri, "thumbnail_key": key}
+            for v, uri, key in zip(vectors, image_uris or [], thumbnail_keys or [None] * len(vectors))
         ]
         session.bulk_insert_mappings(table_class, vector_dicts)
         session.commit()
@@ -101,21 +113,57 @@ def save_vectors_bulk(vectors, model_id, model_type, model_dim, image_uris=None)
 
 
 # FIXME: A lot can be improved
-def search_embeddings(query_vector, model_id, model_type, model_dim, top_k=100):
+def search_embeddings(query_vector, model_id, model_type, model_dim, top_k=100, after=None,
+                      rerank_with=None):
 
     query_vector = query_vector.tolist() # Slow
     query_vector_cast = cast(query_vector, Vector(model_dim)) #FIXME: Hack
 
     table_class = fetch_embedding_table(model_type, model_dim)
 
+    distance = func.cosine_distance(table_class.vector, query_vector_cast)
+
     with Session(engine) as session:
-        results = (
+        query = (
             session.query(
-                table_class.image_uri,  
-                func.cosine_distance(table_class.vector, query_vector_cast).label("distance") 
+                table_class.id,
+                table_class.image_uri,
+                table_class.thumbnail_key,
+                distance.label("distance") 
             )
             .filter(table_class.model_id == model_id)  # Filter by model_id
-            .order_by("distance")  
+        )
+        row_id = table_class.id
+        if rerank_with is not None:
+            # Cascade candidates are only useful if the rerank model embedded the same image_uri
+            rerank_model_id, rerank_model_type, rerank_model_dim = rerank_with
+            rerank_class = aliased(fetch_embedding_table(rerank_model_type, rerank_model_dim))
+            query = query.filter(exists().where(
+                rerank_class.model_id == rerank_model_id,
+                rerank_class.image_uri == table_class.image_uri,
+            ))
+            # Re-uploads duplicate rows, keep the closest per image_uri so top_k counts images
+            candidates = (
+                query
+                .distinct(table_class.image_uri)
+                .order_by(table_class.image_uri, distance, table_class.id)
+                .subquery()
+            )
+            query = session.query(
+                candidates.c.id, candidates.c.image_uri, candidates.c.thumbnail_key, candidates.c.distance
+            )
+            distance = candidates.c.distance
+            row_id = candidates.c.id
+        if after is not None:
+            # Keyset continuation from the last (distance, id) served, stable unlike OFFSET
+            after_distance, after_id = after
+            query = query.filter(or_(
+                distance > after_distance,
+                and_(distance == after_distance, row_id > after_id),
+            ))
+        results = (
+            query
+            .order_by("distance", row_id)  # id breaks ties so the order is total
             .limit(top_k)  # Limit results
             .all()
         )
@@ -126,8 +174,51 @@ def search_embeddings(query_vector, model_id, model_type, model_dim, top_k=100):
     # Convert results into a list of dictionaries
     # This is again slow, look for different methods
     ordered_results = [
-        {"image_uri": result.image_uri, "distance": result.distance} for result in results
+        {"id": result.id, "image_uri": result.image_uri, "thumbnail_key": result.thumbnail_key,
+         "distance": result.distance}
+        for result in results
     ]
 
     print(f"Search results from {table_class.__tablename__}: {ordered_results}")
     return ordered_results
+
+
+def rerank_embeddings(query_vector, image_uris, model_id, model_type, model_dim, top_k=100):
+    """Exact distance of the query against the stored vectors of the given candidates."""
+    query_vector_cast = cast(query_vector.tolist(), Vector(model_dim))
+
+    table_class = fetch_embedding_table(model_type, model_dim)
+
+    # The (model_id, image_uri) index restricts this to the candidate rows; no LIMIT, so the
+    # distance is computed exactly for each of them instead of going through an ANN index
+    with Session(engine) as session:
+        results = (
+            session.query(
+                table_class.image_uri,
+                table_class.thumbnail_key,
+                func.cosine_distance(table_class.vector, query_vector_cast).label("distance")
+            )
+            .filter(table_class.model_id == model_id)
+            .filter(table_class.image_uri.in_(image_uris))
+            .order_by("distance")
+            .all()
+        )
+
+    if not results:
+        return {"error": f"No embeddings found for model_id {model_id} matching the candidates."}
+
+    matched = len({result.image_uri for result in results})
+    if matched < len(set(image_uris)):
+        print(f"Rerank dropped {len(set(image_uris)) - matched} candidates without a {model_id} embedding")
+
+    # Keep the closest row per image_uri in case the catalogue was ingested twice
+    reranked = []
+    seen = set()
+    for result in results:
+        if result.image_uri in seen:
+            continue
+        seen.add(result.image_uri)
+        reranked.append({"image_uri": result.image_uri, "thumbnail_key": result.thumbnail_key,
+                         "distance": result.distance})
+
+    return reranked[:top_k]
@@ -5,16 +5,25 @@ from fastapi import FastAPI, UploadFile, Form, BackgroundTasks, APIRouter
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse
 
 from starlette.requests import Request
 
 from celery.result import AsyncResult
+from redis.exceptions import LockError
 
-from .tasks import search_vector, add_vector
+from .tasks import search_vector, add_vector, start_search_session
+from .search_session import get_page, DEFAULT_PAGE_SIZE, SESSION_MAX_CANDIDATES
+from .thumbnails import (
+    THUMBNAIL_DIR, THUMBNAIL_SIZES, thumbnail_path, build_missing_thumbnail, resolve_catalogue_path
+)
 import asyncio
 
 
+THUMBNAIL_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/temp_catalogue", StaticFiles(directory="temp_catalogue"), name="temp_catalogue")
@@ -46,6 +55,61 @@ async def search_with_image(file: UploadFile,
         raise HTTPException(status_code=500, detail=f"Task failed: {str(e)}")
 
 
+@app.post("/search_session")
+async def search_session(file: UploadFile,
+                         model_id: str = Form(None),
+                         page_size: int = Form(DEFAULT_PAGE_SIZE)):
+    """Run a search once and keep its ranked results for cursor based paging."""
+    if not model_id:
+        raise HTTPException(status_code=400, detail="model_id is required")
+    if page_size <= 0:
+        raise HTTPException(status_code=400, detail="Invalid page_size.")
+    page_size = min(page_size, SESSION_MAX_CANDIDATES)
+    temp_path = f"temp/{file.filename}"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(file.file.read())
+        task = start_search_session.delay(temp_path, model_id, page_size)
+        return {"task_id": task.id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Task failed: {str(e)}")
+
+
+@app.get("/search_session/{session_id}")
+def search_session_page(session_id: str, cursor: int = 0, page_size: int = DEFAULT_PAGE_SIZE):
+    """Serve a page of a stored search session."""
+    if cursor < 0 or page_size <= 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor or page_size.")
+    page_size = min(page_size, SESSION_MAX_CANDIDATES)
+    try:
+        page = get_page(session_id, cursor=cursor, page_size=page_size)
+    except LockError:
+        raise HTTPException(status_code=503, detail="Search session is busy, retry shortly.")
+    if page is None:
+        raise HTTPException(status_code=404, detail="Search session expired or not found.")
+    return page
+
+
+@app.get("/thumbnail/{name}")
+def get_thumbnail(name: str, image_uri: str = None):
+    """Serve a content-hashed thumbnail, building it from the original if missing."""
+    stem, ext = os.path.splitext(name)
+    key, _, size = stem.rpartition("_")
+    if ext != ".webp" or not key.isalnum() or size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail="Invalid thumbnail name.")
+
+    path = thumbnail_path(key, size)
+    if not os.path.exists(path):
+        image_path = resolve_catalogue_path(image_uri) if image_uri else None
+        if image_path is None:
+            raise HTTPException(status_code=404, detail="Thumbnail not found.")
+        path = build_missing_thumbnail(image_path, key, size)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Original image has changed.")
+
+    return FileResponse(path, media_type="image/webp", headers=THUMBNAIL_CACHE_HEADERS)
+
+
 # FIXME: Add base64 encoded upload, progress bar UI
 @router.post("/upload_catalogue")
 async def upload_catalogue(
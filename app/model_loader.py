@@ -29,6 +29,29 @@ else:
     MODEL_CONFIGS = {DEFAULT_MODEL_CONFIG["model_id"]: DEFAULT_MODEL_CONFIG}
 
 
+def load_image(image):
+    """Accept a path or an already decoded PIL image."""
+    if isinstance(image, Image.Image):
+        return image if image.mode == "RGB" else image.convert("RGB")
+    return Image.open(image).convert("RGB")
+
+
+DEFAULT_CANDIDATE_K = 200
+
+
+def get_cascade_config(model_id):
+    """Return the cascade entry for model_id, None if it is a single model."""
+    model_info = MODEL_CONFIGS.get(model_id)
+    if model_info is None or model_info["model_type"] != "cascade":
+        return None
+    return {
+        "model_id": model_id,
+        "candidate_model_id": model_info["candidate_model_id"],
+        "rerank_model_id": model_info["rerank_model_id"],
+        "candidate_k": model_info.get("candidate_k", DEFAULT_CANDIDATE_K),
+    }
+
+
 class BaseModel(ABC):
     @abstractmethod
     def preprocess(self):
@@ -53,7 +76,7 @@ class ResNet50Model(BaseModel):
         ])
 
     def extract_features(self, image_path):
-        img = Image.open(image_path).convert("RGB")
+        img = load_image(image_path)
         input_tensor = self.preprocess()(img).unsqueeze(0)
         with torch.no_grad():
             features = self.model(input_tensor)
@@ -63,14 +86,13 @@ class ResNet50Model(BaseModel):
 class VGG16Model(BaseModel):
     def __init__(self):
         self.model = vgg16(weights=VGG16_Weights.DEFAULT)
-        # FIXME: VGG16 does not yield 4096 in the last layer, you would get 7 x 7 x 512
-        # We are interested in 4096 len feature vector hence this hack.
-        # 7x7x512 = 25088
+        # The conv features are 7 x 7 x 512 = 25088, we want the 4096 len fc7 output.
+        # Reuse the pretrained classifier minus its final 1000 class layer so the
+        # embedding is the same in every process (a fresh nn.Linear head was random).
         self.model = nn.Sequential(
             *list(self.model.children())[:-1],
-            nn.Flatten(), 
-            nn.Linear(25088, 4096), 
-            nn.ReLU() 
+            nn.Flatten(),
+            *list(self.model.classifier.children())[:-1],
         )
         self.model.eval()
 
@@ -82,7 +104,7 @@ class VGG16Model(BaseModel):
         ])
 
     def extract_features(self, image_path):
-        img = Image.open(image_path).convert("RGB")
+        img = load_image(image_path)
         input_tensor = self.preprocess()(img).unsqueeze(0)
         with torch.no_grad():
             features = self.model(input_tensor)
@@ -108,7 +130,7 @@ class OpenCLIPModel(BaseModel):
 
     def extract_features(self, image_path):
         # FIXME: Add batch
-        img = Image.open(image_path).convert("RGB")
+        img = load_image(image_path)
         if self.model_subtype == "fashion_clip":
             features = self.model.encode_images([img], batch_size=1)
             return features.squeeze()
@@ -132,6 +154,8 @@ class ModelLoader:
 
         model_info = MODEL_CONFIGS.get(model_id, DEFAULT_MODEL_CONFIG)
         model_type = model_info["model_type"]
+        if model_type == "cascade":
+            raise ValueError(f"{model_id} is a cascade, load its candidate and rerank models instead")
         model_dim = model_info["model_dim"]
         model_subtype = None
         if "model_subtype" in model_info.keys():
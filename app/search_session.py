@@ -0,0 +1,165 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import redis
+
+from .db import search_embeddings
+from .thumbnails import add_thumbnail_uris
+
+# Ranked candidates of a search are kept in redis so pages can be served
+# without re-running feature extraction and the vector scan.
+SESSION_TTL = int(os.getenv("SEARCH_SESSION_TTL", 900))
+SESSION_PREFETCH = int(os.getenv("SEARCH_SESSION_PREFETCH", 100))
+SESSION_MAX_CANDIDATES = int(os.getenv("SEARCH_SESSION_MAX_CANDIDATES", 1000))
+SESSION_LOCK_TIMEOUT = 30
+DEFAULT_PAGE_SIZE = 20
+
+_redis_client = None
+
+
+def get_redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(os.getenv("REDIS_URL"))
+    return _redis_client
+
+
+def _meta_key(session_id):
+    return f"search_session:{session_id}:meta"
+
+
+def _results_key(session_id):
+    return f"search_session:{session_id}:results"
+
+
+def _lock_key(session_id):
+    return f"search_session:{session_id}:lock"
+
+
+def _fetch_candidates(query_vector, model_id, model_type, model_dim, after, limit):
+    results = search_embeddings(query_vector, model_id, model_type, model_dim,
+                                top_k=limit, after=after)
+    # search_embeddings reports an empty scan as an error dict
+    if isinstance(results, dict):
+        return []
+    return add_thumbnail_uris(results)
+
+
+def create_session(query_vector, model_id, model_type, model_dim, page_size=DEFAULT_PAGE_SIZE):
+    """Run the scan once, store the ranked candidates and return the first page."""
+    session_id = uuid.uuid4().hex
+    prefetch = max(SESSION_PREFETCH, page_size)
+    candidates = _fetch_candidates(query_vector, model_id, model_type, model_dim, None, prefetch)
+
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    meta = {
+        "model_id": model_id,
+        "model_type": model_type,
+        "model_dim": model_dim,
+        "query_vector": query_vector.tobytes(),
+        "exhausted": int(len(candidates) < prefetch),
+    }
+    meta.update(_last_key(candidates))
+
+    return _store_session(session_id, meta, candidates, page_size)
+
+
+def create_static_session(results, page_size=DEFAULT_PAGE_SIZE):
+    """Store an already final ranking, e.g. a re-ranked cascade, and return the first page."""
+    session_id = uuid.uuid4().hex
+    return _store_session(session_id, {"exhausted": 1}, add_thumbnail_uris(results), page_size)
+
+
+def _last_key(candidates):
+    """Keyset position after the last stored candidate, for the next extension."""
+    if not candidates:
+        return {}
+    return {"last_distance": repr(candidates[-1]["distance"]), "last_id": candidates[-1]["id"]}
+
+
+def _store_session(session_id, meta, candidates, page_size):
+    client = get_redis()
+    with client.pipeline() as pipe:
+        pipe.hset(_meta_key(session_id), mapping=meta)
+        if candidates:
+            pipe.rpush(_results_key(session_id), *[json.dumps(c) for c in candidates])
+        pipe.expire(_meta_key(session_id), SESSION_TTL)
+        pipe.expire(_results_key(session_id), SESSION_TTL)
+        pipe.execute()
+
+    return get_page(session_id, cursor=0, page_size=page_size)
+
+
+def _extend_session(session_id, meta, stored):
+    """Append the next chunk of candidates to a session, returns the number added."""
+    limit = min(SESSION_PREFETCH, SESSION_MAX_CANDIDATES - stored)
+    if limit <= 0:
+        get_redis().hset(_meta_key(session_id), "exhausted", 1)
+        return 0
+
+    model_dim = int(meta[b"model_dim"])
+    query_vector = np.frombuffer(meta[b"query_vector"], dtype=np.float32)
+    after = None
+    if b"last_id" in meta:
+        after = (float(meta[b"last_distance"]), int(meta[b"last_id"]))
+    candidates = _fetch_candidates(query_vector, meta[b"model_id"].decode(),
+                                   meta[b"model_type"].decode(), model_dim, after, limit)
+
+    client = get_redis()
+    with client.pipeline() as pipe:
+        if candidates:
+            pipe.rpush(_results_key(session_id), *[json.dumps(c) for c in candidates])
+            pipe.hset(_meta_key(session_id), mapping=_last_key(candidates))
+        if len(candidates) < limit:
+            pipe.hset(_meta_key(session_id), "exhausted", 1)
+        pipe.execute()
+    return len(candidates)
+
+
+def get_page(session_id, cursor=0, page_size=DEFAULT_PAGE_SIZE):
+    """Serve a page of a session by cursor, extending the candidate list lazily.
+
+    Returns None for an expired session, raises redis LockError if another request
+    holds the extension lock for longer than SESSION_LOCK_TIMEOUT.
+    """
+    client = get_redis()
+    meta = client.hgetall(_meta_key(session_id))
+    if not meta:
+        return None
+
+    stored = client.llen(_results_key(session_id))
+    exhausted = int(meta[b"exhausted"])
+    while not exhausted and cursor + page_size > stored:
+        # SET NX lock so concurrent pages past the end don't append the same chunk twice
+        with client.lock(_lock_key(session_id), timeout=SESSION_LOCK_TIMEOUT,
+                         blocking_timeout=SESSION_LOCK_TIMEOUT):
+            # Another request may have extended the session, or it expired, while we waited
+            meta = client.hgetall(_meta_key(session_id))
+            if not meta:
+                return None
+            stored = client.llen(_results_key(session_id))
+            exhausted = int(meta[b"exhausted"])
+            if exhausted or cursor + page_size <= stored:
+                break
+            stored += _extend_session(session_id, meta, stored)
+            exhausted = client.hget(_meta_key(session_id), "exhausted")
+            if exhausted is None:
+                return None
+            exhausted = int(exhausted)
+
+    # Browsing keeps the session alive
+    client.expire(_meta_key(session_id), SESSION_TTL)
+    client.expire(_results_key(session_id), SESSION_TTL)
+
+    page = client.lrange(_results_key(session_id), cursor, cursor + page_size - 1)
+    next_cursor = cursor + len(page)
+    if exhausted and next_cursor >= stored:
+        next_cursor = None
+
+    return {
+        "session_id": session_id,
+        "results": [json.loads(item) for item in page],
+        "next_cursor": next_cursor,
+    }
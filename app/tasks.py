@@ -1,7 +1,11 @@
 from celery import Celery
+import io
 import os
-from .db import save_vector, save_vectors_bulk, search_embeddings
-from .model_loader import ModelLoader, DEFAULT_MODEL_CONFIG
+from PIL import Image
+from .db import save_vector, save_vectors_bulk, search_embeddings, rerank_embeddings
+from .model_loader import ModelLoader, DEFAULT_MODEL_CONFIG, get_cascade_config, load_image
+from .thumbnails import content_key, generate_thumbnails, add_thumbnail_uris
+from .search_session import create_session, create_static_session, DEFAULT_PAGE_SIZE
 import numpy as np
 
 DEFAULT_MODEL_ID = DEFAULT_MODEL_CONFIG["model_id"]
@@ -25,27 +29,76 @@ def add_vector(folder_path, model_id=None):
     if model_id is None:
         model_id = DEFAULT_MODEL_ID
 
-    model = ModelLoader.load_model(model_id)
-    model_type = model.type
-    print(f"Add using model: {model_id} model_dim: {model.output_dim}, model_type: {model_type}")
-    vectors = []
+    # A cascade needs the same image_uris embedded by both of its models
+    cascade = get_cascade_config(model_id)
+    if cascade:
+        model_ids = [cascade["candidate_model_id"], cascade["rerank_model_id"]]
+    else:
+        model_ids = [model_id]
+
+    models = {mid: ModelLoader.load_model(mid) for mid in model_ids}
+    for mid, model in models.items():
+        print(f"Add using model: {mid} model_dim: {model.output_dim}, model_type: {model.type}")
+    vectors = {mid: [] for mid in model_ids}
     image_uris = []
+    thumbnail_keys = []
     for file in os.listdir(folder_path):
         file_path = os.path.join(folder_path, file)
-        vector = model.extract_features(file_path)
-        print(f"Saving vector len: {len(vector)}")
-        vectors.append(vector)
+        with open(file_path, "rb") as f:
+            data = f.read()
+        # Decode once and share the image between thumbnails and feature extraction
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        key = content_key(data)
+        generate_thumbnails(img, key)
+        for mid, model in models.items():
+            vector = model.extract_features(img)
+            print(f"Saving vector len: {len(vector)}")
+            vectors[mid].append(vector)
         image_uris.append(file_path)
+        thumbnail_keys.append(key)
 
-    save_vectors_bulk(vectors, model_id, model_type, model.output_dim, image_uris=image_uris)
+    for mid, model in models.items():
+        save_vectors_bulk(vectors[mid], mid, model.type, model.output_dim, image_uris=image_uris,
+                          thumbnail_keys=thumbnail_keys)
     return "Catalogue updated successfully"
 
 
+def cascade_search(image_path, cascade, top_k=100):
+    """Retrieve candidates with the fast model, re-rank them exactly with the expensive one."""
+    candidate_model_id = cascade["candidate_model_id"]
+    rerank_model_id = cascade["rerank_model_id"]
+    candidate_model = ModelLoader.load_model(candidate_model_id)
+    rerank_model = ModelLoader.load_model(rerank_model_id)
+    print(f"Cascade search image: {image_path} candidates: {candidate_model_id} "
+          f"k: {cascade['candidate_k']}, rerank: {rerank_model_id}")
+
+    img = load_image(image_path)
+    query_vector = candidate_model.extract_features(img)
+    candidates = search_embeddings(query_vector, candidate_model_id, candidate_model.type,
+                                   candidate_model.output_dim, top_k=cascade["candidate_k"],
+                                   rerank_with=(rerank_model_id, rerank_model.type, rerank_model.output_dim))
+    if not isinstance(candidates, list):
+        return candidates
+
+    # Only pay for the expensive embedding once there is something to re-rank
+    query_vector = rerank_model.extract_features(img)
+    return rerank_embeddings(query_vector, [c["image_uri"] for c in candidates], rerank_model_id,
+                             rerank_model.type, rerank_model.output_dim, top_k=top_k)
+
+
 @celery.task
 def search_vector(image_path, model_id=None, top_k = 100):
     if model_id is None:
         model_id = DEFAULT_MODEL_ID
 
+    cascade = get_cascade_config(model_id)
+    if cascade:
+        results = cascade_search(image_path, cascade, top_k=top_k)
+        if isinstance(results, list):
+            add_thumbnail_uris(results)
+        print(f"Final results: {results}")
+        return results
+
     #FIXME: Encapsulate
     model = ModelLoader.load_model(model_id)
     model_type = model.type
@@ -53,7 +106,34 @@ def search_vector(image_path, model_id=None, top_k = 100):
 
     query_vector = model.extract_features(image_path)
     results = search_embeddings(query_vector, model_id, model_type, model.output_dim, top_k=top_k)
+    if isinstance(results, list):
+        add_thumbnail_uris(results)
 
     print(f"Final results: {results}")
     return results
 
+
+@celery.task
+def start_search_session(image_path, model_id=None, page_size=DEFAULT_PAGE_SIZE):
+    if model_id is None:
+        model_id = DEFAULT_MODEL_ID
+
+    cascade = get_cascade_config(model_id)
+    if cascade:
+        # The re-ranked list is final, page over all of it
+        results = cascade_search(image_path, cascade, top_k=cascade["candidate_k"])
+        if not isinstance(results, list):
+            results = []
+        page = create_static_session(results, page_size=page_size)
+        print(f"Search session {page['session_id']} first page: {len(page['results'])} results")
+        return page
+
+    model = ModelLoader.load_model(model_id)
+    model_type = model.type
+    print(f"Search session image: {image_path} with model: {model_id} model_dim: {model.output_dim}, model_type: {model_type}")
+
+    query_vector = model.extract_features(image_path)
+    page = create_session(query_vector, model_id, model_type, model.output_dim, page_size=page_size)
+
+    print(f"Search session {page['session_id']} first page: {len(page['results'])} results")
+    return page
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import uuid
+from urllib.parse import quote
+
+from PIL import Image, ImageOps
+
+CATALOGUE_DIR = "temp_catalogue"
+THUMBNAIL_DIR = os.path.join(CATALOGUE_DIR, "_thumbnails")
+THUMBNAIL_SIZES = {"small": 128, "medium": 256}
+DEFAULT_THUMBNAIL_SIZE = "small"
+THUMBNAIL_QUALITY = 80
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def thumbnail_name(key, size):
+    return f"{key}_{size}.webp"
+
+
+def thumbnail_path(key, size):
+    return os.path.join(THUMBNAIL_DIR, thumbnail_name(key, size))
+
+
+def thumbnail_uri(key, size, image_uri):
+    # The source is carried along so the endpoint can build a missing thumbnail
+    return f"/thumbnail/{thumbnail_name(key, size)}?image_uri={quote(image_uri)}"
+
+
+def generate_thumbnail(img, key, size):
+    """Write a single WebP thumbnail for an already decoded image."""
+    path = thumbnail_path(key, size)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    # WebP doesn't carry EXIF, bake the orientation in; the embedding keeps the raw image
+    thumb = ImageOps.exif_transpose(img)
+    thumb.thumbnail((THUMBNAIL_SIZES[size], THUMBNAIL_SIZES[size]))
+    # Unique per call, concurrent requests for the same thumbnail share a process
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    thumb.save(tmp_path, "WEBP", quality=THUMBNAIL_QUALITY)
+    os.replace(tmp_path, path)
+    return path
+
+
+def generate_thumbnails(img, key):
+    return {size: generate_thumbnail(img, key, size) for size in THUMBNAIL_SIZES}
+
+
+def build_missing_thumbnail(image_path, key, size):
+    """Build a thumbnail on the fly, None if the original no longer matches the key."""
+    with open(image_path, "rb") as f:
+        data = f.read()
+    if content_key(data) != key:
+        return None
+    with Image.open(image_path) as img:
+        return generate_thumbnail(img.convert("RGB"), key, size)
+
+
+def resolve_catalogue_path(image_uri):
+    """Return the catalogue file for an image_uri, or None if it is outside the catalogue."""
+    catalogue = os.path.realpath(CATALOGUE_DIR)
+    path = os.path.realpath(image_uri.lstrip("/"))
+    if os.path.commonpath([catalogue, path]) != catalogue or not os.path.isfile(path):
+        return None
+    return path
+
+
+def add_thumbnail_uris(results):
+    """Turn the thumbnail_key stored at ingestion into thumbnail URIs on each search result."""
+    for result in results:
+        image_uri = result.get("image_uri")
+        key = result.pop("thumbnail_key", None)
+        result["thumbnail_uri"] = None
+        result["thumbnail_uris"] = None
+        # Rows ingested before thumbnails existed have no key, the grid falls back to image_uri
+        if not image_uri or not key:
+            continue
+        result["thumbnail_uri"] = thumbnail_uri(key, DEFAULT_THUMBNAIL_SIZE, image_uri)
+        result["thumbnail_uris"] = {
+            size: thumbnail_uri(key, size, image_uri) for size in THUMBNAIL_SIZES
+        }
+    return results
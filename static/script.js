@@ -100,7 +100,7 @@ document.getElementById('imageSearchButton').addEventListener('click', async ()
         }
 
         try {
-            const response = await fetch('/search_with_image', {
+            const response = await fetch('/search_session', {
                 method: 'POST',
                 body: formData
             });
@@ -147,15 +147,21 @@ function pollTaskStatus(taskId) {
                     return;
                 }
 
-                if (!Array.isArray(data.result)) {
-                    // Alert if the result is not an array
+                if (!Array.isArray(data.result.results)) {
+                    // Alert if the result is not a page of results
                     alert("Unexpected result format received. Please try again.");
                     displayNoResults("Unexpected result format received.");
                     return;
                 }
 
-                // If all checks pass, display the results
-                displaySearchResults(data.result);
+                if (!data.result.results.length) {
+                    displayNoResults("No valid results returned.");
+                    return;
+                }
+
+                // If all checks pass, display the first page of the session
+                displaySearchResults(data.result.results);
+                updateLoadMoreButton(data.result.session_id, data.result.next_cursor);
 
             } else if (data.status === 'FAILURE') {
                 clearInterval(interval);
@@ -172,9 +178,10 @@ function pollTaskStatus(taskId) {
     }, 1000);
 }
 
-// Display search results
-function displaySearchResults(results) {
-    const container = document.createElement('div');
+// Display search results, appending to the current grid when paging
+function displaySearchResults(results, append = false) {
+    const existingGrid = document.querySelector('.result-grid');
+    const container = append && existingGrid ? existingGrid : document.createElement('div');
     container.className = 'result-grid';
 
     results.forEach(result => {
@@ -183,8 +190,10 @@ function displaySearchResults(results) {
 
         const img = document.createElement('img');
 
-        if (result.image_uri) {
-            img.src = result.image_uri;
+        if (result.thumbnail_uri || result.image_uri) {
+            // Thumbnails are content-hashed, the browser caches them across searches
+            img.src = result.thumbnail_uri || result.image_uri;
+            img.loading = 'lazy';
             img.alt = 'Search Result';
         } else {
             img.src = '/static/placeholder.png'; 
@@ -202,14 +211,54 @@ function displaySearchResults(results) {
         container.appendChild(resultDiv);
     });
 
-    const existingGrid = document.querySelector('.result-grid');
-    if (existingGrid) {
-        existingGrid.replaceWith(container);
+    if (container === existingGrid) {
+        return;
+    }
+    const existing = document.querySelector('.result-grid') || document.querySelector('.no-results');
+    if (existing) {
+        existing.replaceWith(container);
     } else {
         document.body.appendChild(container);
     }
 }
 
+// Show a "Load More" button while the search session has more pages
+function updateLoadMoreButton(sessionId, nextCursor) {
+    let button = document.getElementById('loadMoreButton');
+    if (nextCursor === null || nextCursor === undefined) {
+        if (button) {
+            button.remove();
+        }
+        return;
+    }
+
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'loadMoreButton';
+        button.textContent = 'Load More';
+    }
+    // Keep the button below the grid
+    document.body.appendChild(button);
+
+    button.onclick = async () => {
+        button.disabled = true;
+        try {
+            const response = await fetch(`/search_session/${sessionId}?cursor=${nextCursor}`);
+            if (!response.ok) {
+                throw new Error(`Error: ${response.statusText}`);
+            }
+
+            const page = await response.json();
+            displaySearchResults(page.results, true);
+            updateLoadMoreButton(page.session_id, page.next_cursor);
+        } catch (error) {
+            alert(`Error: ${error.message}`);
+        } finally {
+            button.disabled = false;
+        }
+    };
+}
+
 // Handle no results case
 function displayNoResults(errorMessage) {
     const container = document.createElement('div');
@@ -218,6 +267,9 @@ function displayNoResults(errorMessage) {
     const message = document.createElement('p');
     message.textContent = `No results found: ${errorMessage}`;
     message.style.color = 'red';
+    container.appendChild(message);
+
+    updateLoadMoreButton(null, null);
 
     const existingGrid = document.querySelector('.result-grid') || document.querySelector('.no-results');
     if (existingGrid) {